@@ -8,10 +8,17 @@ and build an email body that matches the requested PDF-like list formatting.
 Requires:
   - requests (HTTP)
   - msal (only if SEND_VIA_GRAPH=true to send mail via Microsoft Graph)
+  - orjson (optional; faster JSON parsing, falls back to the stdlib json module)
+  - ijson (only if STREAM_PAGES=true to stream story pages, trading speed for lower peak memory)
+  - aiohttp (only if ASYNC_PAGINATION=true to fetch story pages on an asyncio event loop)
+  - brotli (optional; lets the Epics API answer with br compression as well as gzip/deflate)
 
 Config via environment variables:
   MENDIX_PAT, MENDIX_APP_ID, EPICS_API_BASE (default: https://epics.api.mendix.com),
   PRICE_PER_POINT (default 55.00), CURRENCY_SYMBOL (default $),
+  PAGE_SIZE (default 500), STATUS_FILTER (default Done; empty disables), PAGE_WORKERS (default 8),
+  ASYNC_PAGINATION (true/false), STREAM_PAGES (true/false),
+  STATUS_CACHE_TTL (seconds, default 3600; 0 disables the on-disk /statuses cache),
   EMAIL_TO, EMAIL_FROM, SEND_VIA_GRAPH (true/false),
   TENANT_ID, CLIENT_ID, CLIENT_SECRET (if sending via Graph)
 
@@ -22,16 +29,43 @@ Epics API notes:
       GET /projects/{appId}/stories
   - API details & scopes: https://docs.mendix.com/apidocs-mxsdk/apidocs/epics-api/
   - Swagger UI cannot be used to call endpoints due to CORS; use Postman/script instead.
+
+Usage:
+  python smartsummary.py [--refresh-statuses]
 """
 
 import os
+import re
 import sys
 import math
+import asyncio
+import argparse
+import functools
+import threading
 import json
 import time
 import html
-from typing import Dict, List, Any
+import io
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+# Optional fast JSON; both paths take/return bytes so callers don't care which is active
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
 
 # Add dotenv support
 from dotenv import load_dotenv
@@ -54,6 +88,7 @@ COMPLETED_STATUS_NAMES = [s.strip() for s in os.getenv(
     "COMPLETED_STATUS_NAMES",
     "Done,Completed,Accepted,Closed Resolved,Closed,Resolved"
 ).replace("  ", " ").split(",") if s.strip()]
+_COMPLETED_LOWER = frozenset(s.lower() for s in COMPLETED_STATUS_NAMES)
 
 # Email settings
 EMAIL_TO = os.getenv("EMAIL_TO", "").strip()
@@ -65,33 +100,108 @@ TENANT_ID = os.getenv("TENANT_ID", "").strip()
 CLIENT_ID = os.getenv("CLIENT_ID", "").strip()
 CLIENT_SECRET = os.getenv("CLIENT_SECRET", "").strip()
 
+# Stories paging/filtering. STATUS_FILTER is sent as ?status= so the API only returns
+# matching stories; set it empty to fetch everything and filter client-side. It only
+# narrows what is downloaded: stories are billed when their status is Done (see
+# completed_story_predicate), so a filter other than Done bills nothing. If your
+# tenant's stories reference their status by id and the server filter drops them,
+# set it empty.
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "500"))
+STATUS_FILTER = os.getenv("STATUS_FILTER", "Done").strip()
+
+# Concurrent page fetches once the page count is known (keep <= the session pool size)
+PAGE_WORKERS = int(os.getenv("PAGE_WORKERS", "8"))
+# Fetch story pages with aiohttp on one event loop instead of the thread pool
+ASYNC_PAGINATION = os.getenv("ASYNC_PAGINATION", "false").strip().lower() == "true"
+# Stream story pages with ijson so rejected stories are dropped while parsing. This is
+# slower than decoding whole pages and only lowers peak memory when the server isn't
+# filtering by status (STATUS_FILTER empty or rejected), so it is used only then.
+STREAM_PAGES = os.getenv("STREAM_PAGES", "false").strip().lower() == "true"
+
+# Statuses rarely change, so fetch_statuses() results are cached on disk per app
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "3600"))
+CACHE_DIR = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "smartsummary"
+
+# Status names counted as done when stories carry their status directly; matched by
+# set membership so no per-story lowercase copy is made
+_DONE_SET = frozenset({"Done", "done", "DONE"})
+
+# Pulls the offset out of pagination link hRefs
+_OFFSET_RE = re.compile(r"offset=(\d+)")
+
+# --- HTTP session ---
+# One pooled session for every Epics/Graph call so TCP+TLS connections are reused
+# across pages instead of being re-established per request.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504]),
+))
+# Epics auth rides on the session defaults; Graph calls override Authorization per request.
+# MENDIX_PAT presence is checked in epics_get so the module imports without one.
+_AUTH_HEADERS = {
+    "Authorization": f"MxToken {MENDIX_PAT}",
+    "Accept": "application/json",
+}
+_SESSION.headers.update(_AUTH_HEADERS)
+# Story pages are large, highly compressible JSON. Ask for every encoding urllib3 can
+# decode here (gzip, deflate, plus br/zstd when brotli/zstandard are installed)
+# rather than a fixed list that might include one we can't read.
+_SESSION.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+
 # --- Helpers ---
 
 def brl_like_currency(amount: float, symbol: str = "$") -> str:
     """
     Format like the example: $110,00 (comma decimal). We keep the $ symbol and use comma decimals.
     """
-    # Format with two decimals using dot, then swap dot->comma
     s = f"{amount:,.2f}"
-    # Replace thousands separator ',' with temporary, then '.' to ',', then temp to '.'
-    # This keeps thousands grouping but flips decimal char.
-    s = s.replace(",", "_").replace(".", ",").replace("_", ".")
-    return f"{symbol}{s}"
+    if not math.isfinite(amount):
+        # nan/inf have no separators to swap
+        return f"{symbol}{s}"
+    # Split off the decimals once and swap the separators: thousands ',' -> '.', decimal '.' -> ','
+    whole, frac = s.rsplit(".", 1)
+    return f"{symbol}{whole.replace(',', '.')},{frac}"
 
-def auth_headers() -> Dict[str, str]:
+def epics_get(path: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
     if not MENDIX_PAT:
         raise RuntimeError("Missing MENDIX_PAT.")
-    return {
-        "Authorization": f"MxToken {MENDIX_PAT}",
-        "Accept": "application/json",
-    }
-
-def epics_get(path: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
     url = f"{EPICS_API_BASE}{path}"
-    r = requests.get(url, headers=auth_headers(), params=params, timeout=60)
+    r = _SESSION.get(url, params=params, timeout=60)
     r.raise_for_status()
-    return r.json()
+    return _json_loads(r.content)
 
+def _disk_cached(filename: str):
+    """
+    Cache a no-arg fetcher's JSON-serializable result in CACHE_DIR for STATUS_CACHE_TTL
+    seconds. `filename` is formatted with app_id. The wrapped function takes
+    refresh=True to bypass a fresh cache entry and overwrite it.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(refresh: bool = False):
+            path = CACHE_DIR / filename.format(app_id=APP_ID)
+            if not refresh and STATUS_CACHE_TTL > 0:
+                try:
+                    if time.time() - path.stat().st_mtime < STATUS_CACHE_TTL:
+                        return _json_loads(path.read_bytes())
+                except (OSError, ValueError):
+                    pass  # missing or unreadable cache: fetch fresh
+            result = fn()
+            if STATUS_CACHE_TTL > 0:
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = path.with_suffix(".tmp")
+                    tmp.write_bytes(_json_dumps(result))
+                    os.replace(tmp, path)
+                except OSError:
+                    pass  # caching is best-effort
+            return result
+        return wrapper
+    return decorator
+
+@_disk_cached("statuses-{app_id}.json")
 def fetch_statuses() -> Dict[str, Dict[str, Any]]:
     """
     Returns a dict keyed by statusId with the status object.
@@ -115,131 +225,324 @@ def is_completed_status(status_obj: Dict[str, Any]) -> bool:
     Also attempt category flags if available (e.g., category == 'DONE').
     """
     name = (status_obj.get("name") or status_obj.get("displayName") or "").strip()
-    if name:
-        for target in COMPLETED_STATUS_NAMES:
-            if name.lower() == target.lower():
-                return True
+    if name.lower() in _COMPLETED_LOWER:
+        return True
     # Try category if present
     cat = (status_obj.get("category") or "").strip().lower()
-    if cat in {"Done"}:
-        return True
-    return False
+    return cat == "done"
 
 def extract_points(story: Dict[str, Any]) -> float:
     """
     Extract story points using OpenAPI spec key.
     """
     val = story.get("storyPoints")
-    if isinstance(val, (int, float)):
-        return float(val)
-    return 0.0
+    return float(val) if isinstance(val, (int, float)) else 0.0
 
 def extract_title(story: Dict[str, Any]) -> str:
     """
     Extract story title using OpenAPI spec key.
     """
-    return str(story.get("title", "")).strip()
+    try:
+        return str(story["title"]).strip()
+    except KeyError:
+        return ""
 
 def extract_description(story: Dict[str, Any]) -> str:
     """
     Extract story description using OpenAPI spec key.
     """
-    return str(story.get("descriptionPlain", "")).strip()
+    try:
+        return str(story["descriptionPlain"]).strip()
+    except KeyError:
+        return ""
 
-def extract_status(story: Dict[str, Any]) -> str:
+def extract_status_id(story: Dict[str, Any]) -> str:
     """
-    Extract story status using OpenAPI spec key.
+    Extract the status reference for stories that don't carry a status name,
+    either as a flat 'statusId' key or as a nested status object.
     """
-    return str(story.get("status", "")).strip()
+    sid = story.get("statusId")
+    if sid:
+        return str(sid).strip()
+    try:
+        status = story["status"]
+        return str(status.get("id") or status.get("statusId") or "").strip()
+    except (KeyError, AttributeError):
+        # No status at all, or a plain status name rather than an object
+        return ""
 
 def extract_story_id(story: Dict[str, Any]) -> str:
     """
     Extract story ID using OpenAPI spec key.
     """
-    return str(story.get("storyId", "")).strip()
-
-def iterate_all_stories() -> List[Dict[str, Any]]:
-    """
-    Pull stories with naive pagination.
-    """
-    all_items: List[Dict[str, Any]] = []
-    params = {"limit": 100, "offset": 0}
-    while True:
-        data = epics_get(f"/projects/{APP_ID}/stories", params=params)
-        # Mendix Epics API always returns a dict with 'stories' key
-        items = data.get("stories", [])
-        all_items.extend(items)
-
-        # Pagination: look for 'links' array with rel: next
-        next_offset = None
-        links = data.get("links", [])
-        for link in links:
-            if link.get("rel") == "next" and link.get("hRef"):
-                # Extract offset from hRef if present
-                import re
-                m = re.search(r"offset=(\d+)", link["hRef"])
-                if m:
-                    next_offset = int(m.group(1))
-                break
+    try:
+        return str(story["storyId"]).strip()
+    except KeyError:
+        return ""
+
+def _link_offset(data: Dict[str, Any], rel: str) -> Optional[int]:
+    """
+    Return the offset= value from the 'links' entry with the given rel, if any.
+    """
+    for link in data.get("links", []):
+        if link.get("rel") == rel and link.get("hRef"):
+            m = _OFFSET_RE.search(link["hRef"])
+            return int(m.group(1)) if m else None
+    return None
+
+StoryPredicate = Callable[[Dict[str, Any]], bool]
+
+def completed_story_predicate(refresh_statuses: bool = False) -> StoryPredicate:
+    """
+    Build the completion test applied while stories are fetched. A story is done
+    when its status name is in _DONE_SET, whether the name is on the story itself or,
+    for stories that reference their status by id, looked up in /statuses. That
+    lookup happens once, even when pages are filtered concurrently.
+    """
+    completed_ids = None
+    lock = threading.Lock()
+
+    def is_completed(story: Dict[str, Any]) -> bool:
+        nonlocal completed_ids
+        status = story.get("status")
+        if isinstance(status, str):
+            return status.strip() in _DONE_SET
+        sid = extract_status_id(story)
+        if not sid:
+            # No status at all: not done, and no reason to call /statuses
+            return False
+        if completed_ids is None:
+            with lock:
+                if completed_ids is None:
+                    print("Fetching statuses...")
+                    statuses_by_id = fetch_statuses(refresh=refresh_statuses)
+                    # Same rule as the name branch, so both story shapes bill identically
+                    completed_ids = {
+                        sid for sid, st in statuses_by_id.items()
+                        if (st.get("name") or st.get("displayName") or "").strip() in _DONE_SET
+                    }
+        return sid in completed_ids
+
+    return is_completed
+
+def _keep_all(story: Dict[str, Any]) -> bool:
+    return True
+
+def _stream_stories(path: str, params: Dict[str, Any], predicate: StoryPredicate) -> List[Dict[str, Any]]:
+    """
+    Fetch one stories page with ijson, keeping only stories that pass `predicate`.
+    Story objects are built by ijson's C backend one at a time, so rejected ones are
+    freed before the next is parsed. Only the stories are read: callers must
+    already know the page plan, since 'links' and 'total' are not returned.
+    """
+    import ijson
+    if not MENDIX_PAT:
+        raise RuntimeError("Missing MENDIX_PAT.")
+    url = f"{EPICS_API_BASE}{path}"
+    with _SESSION.get(url, params=params, stream=True, timeout=60) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        return [st for st in ijson.items(r.raw, "stories.item", use_float=True) if predicate(st)]
+
+def _fetch_stories_page(path: str, params: Dict[str, Any], predicate: StoryPredicate) -> Dict[str, Any]:
+    data = epics_get(path, params=params)
+    data["stories"] = [st for st in data.get("stories", []) if predicate(st)]
+    return data
 
-        if next_offset is not None and next_offset != params["offset"]:
-            params["offset"] = next_offset
-        else:
-            break
+def _page_plan(first: Dict[str, Any]) -> (Optional[int], Optional[int]):
+    """
+    From the first stories page, return (stride, end offset). The stride is the
+    rel: next offset (None when there is only one page); the end comes from 'total'
+    or the rel: last link and is None when the page has neither.
+    """
+    step = _link_offset(first, "next")
+    end = first.get("total")
+    if not isinstance(end, int):
+        last = _link_offset(first, "last")
+        end = last + 1 if last is not None else None
+    return step, end
+
+async def _iterate_all_stories_async(predicate: StoryPredicate = _keep_all) -> List[Dict[str, Any]]:
+    """
+    aiohttp variant of iterate_all_stories: same paging plan, but the remaining
+    pages are awaited together on one event loop and one keep-alive pool.
+    At most PAGE_WORKERS requests are in flight. Timeouts apply per socket
+    operation, like the requests path, so queued pages don't eat into a shared budget.
+    """
+    import aiohttp
+    if not MENDIX_PAT:
+        raise RuntimeError("Missing MENDIX_PAT.")
+    url = f"{EPICS_API_BASE}/projects/{APP_ID}/stories"
+    base = {"limit": PAGE_SIZE}
+    if STATUS_FILTER:
+        base["status"] = STATUS_FILTER
+
+    slots = asyncio.Semaphore(PAGE_WORKERS)
+    async with aiohttp.ClientSession(headers=_AUTH_HEADERS,
+                                     connector=aiohttp.TCPConnector(limit=PAGE_WORKERS),
+                                     timeout=aiohttp.ClientTimeout(total=None, sock_connect=60,
+                                                                   sock_read=60)) as session:
+        async def get_page(offset: int) -> Dict[str, Any]:
+            async with slots:
+                async with session.get(url, params={**base, "offset": offset}) as r:
+                    r.raise_for_status()
+                    data = _json_loads(await r.read())
+            # The predicate may block (e.g. fetching /statuses), so run it off the event loop
+            data["stories"] = await asyncio.to_thread(
+                lambda: [st for st in data.get("stories", []) if predicate(st)])
+            return data
+
+        try:
+            first = await get_page(0)
+        except aiohttp.ClientResponseError as ex:
+            # Server doesn't accept the status filter: page through everything instead
+            if "status" not in base or ex.status not in (400, 422):
+                raise
+            del base["status"]
+            first = await get_page(0)
+        all_items: List[Dict[str, Any]] = list(first.get("stories", []))
+
+        step, end = _page_plan(first)
+        if not step:
+            return all_items
+
+        if end is None:
+            offset = step
+            while True:
+                data = await get_page(offset)
+                all_items.extend(data.get("stories", []))
+                next_offset = _link_offset(data, "next")
+                if next_offset is None or next_offset == offset:
+                    break
+                offset = next_offset
+            return all_items
+
+        pages = await asyncio.gather(*(get_page(o) for o in range(step, end, step)))
+        all_items.extend(chain.from_iterable(p.get("stories", []) for p in pages))
 
     return all_items
 
-def build_email_lines(completed_stories: List[Dict[str, Any]]) -> (str, str, float):
+def iterate_all_stories(predicate: StoryPredicate = _keep_all) -> List[Dict[str, Any]]:
     """
-    Build plain-text and HTML email bodies and return (text, html, total_amount)
+    Pull stories: the first page tells us the page stride and the end offset
+    (from 'total' or the rel: last link), then the remaining pages are fetched
+    concurrently. Falls back to following rel: next links one by one when the
+    response carries neither.
+    STATUS_FILTER is passed as ?status=; if the API rejects it (400/422) all stories
+    are fetched and `predicate` does the filtering. Only stories passing `predicate`
+    are collected; with STREAM_PAGES=true and no server-side filter, the concurrently
+    fetched pages drop the others while being parsed. With ASYNC_PAGINATION=true the
+    aiohttp variant is used instead.
     """
-    lines_txt: List[str] = []
-    lines_html: List[str] = []
+    if ASYNC_PAGINATION:
+        return asyncio.run(_iterate_all_stories_async(predicate))
 
-    total = 0.0
-    for st in completed_stories:
-        story_id = extract_story_id(st)
-        title = extract_title(st)
-        desc = extract_description(st)
-        pts = extract_points(st)
-        price = pts * PRICE_PER_POINT
-        total += price
+    path = f"/projects/{APP_ID}/stories"
+    base = {"limit": PAGE_SIZE}
+    if STATUS_FILTER:
+        base["status"] = STATUS_FILTER
+    try:
+        first = _fetch_stories_page(path, {**base, "offset": 0}, predicate)
+    except requests.HTTPError as ex:
+        # Server doesn't accept the status filter: page through everything instead
+        if "status" not in base or ex.response is None or ex.response.status_code not in (400, 422):
+            raise
+        del base["status"]
+        first = _fetch_stories_page(path, {**base, "offset": 0}, predicate)
+    # Mendix Epics API always returns a dict with 'stories' key
+    all_items: List[Dict[str, Any]] = list(first.get("stories", []))
+
+    step, end = _page_plan(first)
+    if not step:
+        return all_items
+
+    if end is None:
+        offset = step
+        while True:
+            data = _fetch_stories_page(path, {**base, "offset": offset}, predicate)
+            all_items.extend(data.get("stories", []))
+            next_offset = _link_offset(data, "next")
+            if next_offset is None or next_offset == offset:
+                break
+            offset = next_offset
+        return all_items
 
-        price_str = brl_like_currency(price, CURRENCY_SYMBOL)
-        lines_txt.append(f"- [{story_id}] {title} {desc} - {price_str}")
-        lines_html.append(
-            f"<li><span>{html.escape(title)}</span><br>"
-            f"<em>{html.escape(desc)}</em>"
-            f"<strong> - {html.escape(price_str)}</strong></li>"
-        )
+    # The plan is known now, so these pages are only needed for their stories
+    if STREAM_PAGES and "status" not in base:
+        fetch = lambda o: _stream_stories(path, {**base, "offset": o}, predicate)
+    else:
+        fetch = lambda o: _fetch_stories_page(path, {**base, "offset": o}, predicate)["stories"]
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as ex:
+        all_items.extend(chain.from_iterable(ex.map(fetch, range(step, end, step))))
 
-    total_str = brl_like_currency(total, CURRENCY_SYMBOL)
+    return all_items
+
+def build_email_lines(completed_stories: List[Dict[str, Any]]) -> (str, str, float):
+    """
+    Build plain-text and HTML email bodies and return (text, html, total_amount)
+    """
+    # Loop-invariant globals bound to locals
+    escape = html.escape
+    pp = PRICE_PER_POINT
+    symbol = CURRENCY_SYMBOL
+
+    rows = [
+        (extract_story_id(st), extract_title(st), extract_description(st), extract_points(st) * pp)
+        for st in completed_stories
+    ]
+    # fsum avoids accumulated float drift when summing many prices
+    total = math.fsum(price for _, _, _, price in rows)
+    price_strs = [brl_like_currency(price, symbol) for _, _, _, price in rows]
+
+    lines_txt = [
+        f"- [{story_id}] {title} {desc} - {price_str}"
+        for (story_id, title, desc, _), price_str in zip(rows, price_strs)
+    ]
+
+    total_str = brl_like_currency(total, symbol)
 
     text_body = "\n".join(lines_txt + [f"\nTotal - {total_str}"])
-    html_body = f"""
-    <div>
-      <ul>
-        {''.join(lines_html)}
-      </ul>
-      <p><strong>Total - {html.escape(total_str)}</strong></p>
-    </div>
-    """.strip()
+
+    # Write the HTML straight into one buffer instead of joining the items and then
+    # interpolating that into the wrapper
+    buf = io.StringIO()
+    write = buf.write
+    write("<div>\n      <ul>\n        ")
+    for (_, title, desc, _), price_str in zip(rows, price_strs):
+        write("<li><span>")
+        write(escape(title))
+        write("</span><br><em>")
+        write(escape(desc))
+        write("</em><strong> - ")
+        write(escape(price_str))
+        write("</strong></li>")
+    write(f"\n      </ul>\n      <p><strong>Total - {escape(total_str)}</strong></p>\n    </div>")
+    html_body = buf.getvalue()
 
     return text_body, html_body, total
 
+@functools.lru_cache(maxsize=None)
+def _graph_app():
+    """
+    Build the MSAL client once. acquire_token_for_client only serves tokens from
+    its cache when the same app instance is reused, so later sends skip the token
+    round-trip until it expires. MSAL keeps its own HTTP client: _SESSION carries
+    the Mendix PAT as a default header, which must not reach the login endpoint.
+    """
+    import msal
+    authority = f"https://login.microsoftonline.com/{TENANT_ID}"
+    return msal.ConfidentialClientApplication(CLIENT_ID, authority=authority, client_credential=CLIENT_SECRET)
+
 def send_via_graph(subject: str, body_html: str, body_text: str):
     """
     Send email with Microsoft Graph (client credentials).
     Requires: TENANT_ID, CLIENT_ID, CLIENT_SECRET, EMAIL_FROM, EMAIL_TO
     """
-    import msal
     if not all([TENANT_ID, CLIENT_ID, CLIENT_SECRET, EMAIL_FROM, EMAIL_TO]):
         raise RuntimeError("Graph send requires TENANT_ID, CLIENT_ID, CLIENT_SECRET, EMAIL_FROM, EMAIL_TO.")
 
-    authority = f"https://login.microsoftonline.com/{TENANT_ID}"
     scope = ["https://graph.microsoft.com/.default"]
-    app = msal.ConfidentialClientApplication(CLIENT_ID, authority=authority, client_credential=CLIENT_SECRET)
-    result = app.acquire_token_for_client(scopes=scope)
+    result = _graph_app().acquire_token_for_client(scopes=scope)
     if "access_token" not in result:
         raise RuntimeError(f"Failed to get Graph token: {result}")
 
@@ -258,25 +561,25 @@ def send_via_graph(subject: str, body_html: str, body_text: str):
 
     # Use the /sendMail action on the sender mailbox
     url = f"https://graph.microsoft.com/v1.0/users/{EMAIL_FROM}/sendMail"
-    r = requests.post(url, headers={"Authorization": f"Bearer {result['access_token']}",
-                                    "Content-Type": "application/json"}, data=json.dumps(msg), timeout=60)
+    r = _SESSION.post(url, headers={"Authorization": f"Bearer {result['access_token']}",
+                                     "Content-Type": "application/json"}, data=_json_dumps(msg), timeout=60)
     if r.status_code not in (200, 202):
         raise RuntimeError(f"Graph send failed: {r.status_code} {r.text}")
 
-def main():
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Build a billing summary of completed Mendix Epics stories.")
+    parser.add_argument("--refresh-statuses", action="store_true",
+                        help="ignore the cached /statuses response and fetch it again")
+    args = parser.parse_args(argv)
+
     if not APP_ID:
         raise RuntimeError("Missing MENDIX_APP_ID (your Mendix app/project ID).")
 
+    # Completion is decided per story while pages are fetched, so rejected stories
+    # are never collected. /statuses is only fetched if a story references its
+    # status by id instead of carrying the name.
     print("Fetching stories...")
-    stories = iterate_all_stories()
-    print(f"Total stories fetched: {len(stories)}")
-
-    completed_stories = []
-    for st in stories:
-        status = extract_status(st)
-        if status.lower() == "done":
-            completed_stories.append(st)
-
+    completed_stories = iterate_all_stories(completed_story_predicate(args.refresh_statuses))
     print(f"Completed stories found: {len(completed_stories)}")
 
     text_body, html_body, total = build_email_lines(completed_stories)